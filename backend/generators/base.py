@@ -1,6 +1,7 @@
 """图片生成器抽象基类"""
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Union, BinaryIO
 
 
 class ImageGeneratorBase(ABC):
@@ -35,6 +36,56 @@ class ImageGeneratorBase(ABC):
         """
         pass
 
+    def generate_image_to(
+        self,
+        prompt: str,
+        sink: BinaryIO,
+        **kwargs
+    ) -> None:
+        """
+        生成图片并直接写入 sink（文件、缓冲区等）
+
+        默认实现先在内存中生成完整图片再写入；支持流式下载的生成器可覆盖此方法，
+        以避免整张图片在内存中重复缓存。
+
+        Args:
+            prompt: 提示词
+            sink: 可写的二进制流
+            **kwargs: 透传给 generate_image 的参数
+        """
+        sink.write(self.generate_image(prompt, **kwargs))
+
+    def generate_images(
+        self,
+        prompts: List[str],
+        concurrency: int = 5,
+        **kwargs
+    ) -> List[Union[bytes, Exception]]:
+        """
+        并发生成多张图片
+
+        单个提示词失败不会中断整批任务，失败项在结果中以异常对象返回。
+
+        Args:
+            prompts: 提示词列表
+            concurrency: 最大并发数（避免触发服务商限流）
+            **kwargs: 透传给 generate_image 的参数
+
+        Returns:
+            与 prompts 顺序一致的结果列表，元素为图片二进制数据或异常
+        """
+        if not prompts:
+            return []
+
+        def _run(prompt: str) -> Union[bytes, Exception]:
+            try:
+                return self.generate_image(prompt, **kwargs)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(prompts)))) as executor:
+            return list(executor.map(_run, prompts))
+
     @abstractmethod
     def validate_config(self) -> bool:
         """
@@ -1,15 +1,61 @@
+import heapq
+import io
+import itertools
 import logging
-import re
+import random
+import shutil
+import threading
 import time
-from typing import Dict, Any, Optional, List
+from concurrent.futures import FIRST_COMPLETED, Future, InvalidStateError, ThreadPoolExecutor, wait
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Any, Callable, Optional, List, BinaryIO, Tuple, Union
 
 import requests
 
 from .base import ImageGeneratorBase
+from ..utils.http_session import (
+    create_session,
+    deadline_timeout,
+    decode_json,
+    encode_json,
+    post_with_retry_after,
+    retry_after_seconds,
+)
+from ..utils.image_cache import ImageResultCache, create_image_cache
 
 logger = logging.getLogger(__name__)
 
 
+def _version_prefix(endpoint_type: str) -> Optional[str]:
+    """提取端点路径开头的版本段（如 /v1/images/generations -> /v1），没有则返回 None"""
+    if not endpoint_type.startswith('/v'):
+        return None
+    end = 2
+    while end < len(endpoint_type) and endpoint_type[end].isdigit():
+        end += 1
+    if end == 2:
+        return None
+    return endpoint_type[:end]
+
+
+# 任务终态（大写）；服务端通常直接返回大写状态，命中时无需再调用 upper()
+_TERMINAL_OK = frozenset({"SUCCEED", "SUCCESS", "SUCCEEDED"})
+_TERMINAL_FAIL = frozenset({"FAILED", "FAILURE", "ERROR"})
+
+# 长轮询窗口下限（秒）：窗口过短时无法区分服务端是否真的等待了 wait 参数
+_MIN_LONG_POLL_SECONDS = 5
+
+# 任务回调登记表：task_id -> 唤醒函数。回调只用于唤醒对应任务立即查询一次，
+# 结果始终以任务查询接口为准，不信任回调内容。
+# 回调可能先于登记到达，此时只记录 task_id 与到达时间，超过 TTL 或数量上限时丢弃最旧的
+_WEBHOOK_LOCK = threading.Lock()
+_WEBHOOK_WAITERS: Dict[str, Callable[[], None]] = {}
+_EARLY_WEBHOOKS: "OrderedDict[str, float]" = OrderedDict()
+_EARLY_WEBHOOK_TTL = 600
+_EARLY_WEBHOOK_MAX = 1024
+
+
 class ModelScopeZImageGenerator(ImageGeneratorBase):
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
@@ -19,13 +65,10 @@ class ModelScopeZImageGenerator(ImageGeneratorBase):
         if not endpoint_type.startswith('/'):
             endpoint_type = '/' + endpoint_type
 
-        version_match = re.search(r'^/(v\d+)', endpoint_type)
-        if version_match:
-            version_prefix = '/' + version_match.group(1)
-            if base_url.endswith(version_prefix):
-                base_url = base_url[:-len(version_prefix)].rstrip('/')
-        elif base_url.endswith('/v1') and endpoint_type.startswith('/v1'):
-            base_url = base_url[:-3].rstrip('/')
+        # base_url 与 endpoint 都带版本段时去掉 base_url 中的，避免拼成 /v1/v1/...
+        version_prefix = _version_prefix(endpoint_type)
+        if version_prefix and base_url.endswith(version_prefix):
+            base_url = base_url[:-len(version_prefix)].rstrip('/')
 
         self.base_url = base_url
         self.endpoint_type = endpoint_type
@@ -35,19 +78,76 @@ class ModelScopeZImageGenerator(ImageGeneratorBase):
         if not self.task_endpoint.startswith('/'):
             self.task_endpoint = '/' + self.task_endpoint
 
-        self.poll_interval_seconds = float(config.get('poll_interval_seconds') or 3)
+        # 轮询间隔按指数退避增长：短任务尽快拿到结果，长任务减少查询次数
+        # 兼容旧配置：未设置 initial_poll_interval_seconds 时沿用 poll_interval_seconds
+        self.initial_poll_interval = float(
+            config.get('initial_poll_interval_seconds') or config.get('poll_interval_seconds') or 0.5
+        )
+        self.max_poll_interval = float(config.get('max_poll_interval_seconds') or 15)
         self.max_wait_seconds = float(config.get('max_wait_seconds') or 300)
+        self._timeout_message = f"ModelScope 任务超时（{self.max_wait_seconds}s）"
         self.max_prompt_chars = int(config.get('max_prompt_chars') or 1900)
+        self._effective_max_chars = max(100, self.max_prompt_chars)
+
+        # 长轮询（默认关闭）：查询时带上 wait 参数，由服务端在任务完成或超时后再返回。
+        # 返回非 200 或立即返回未完成状态时，视为服务端不支持，后续回退为普通轮询。
+        # 生成器实例会被多个工作线程共用，状态切换需加锁
+        long_poll_seconds = float(config.get('long_poll_seconds') or 0)
+        if 0 < long_poll_seconds < _MIN_LONG_POLL_SECONDS:
+            logger.warning(
+                f"long_poll_seconds={long_poll_seconds:g} 过小，无法区分服务端是否等待，"
+                f"已调整为 {_MIN_LONG_POLL_SECONDS} 秒"
+            )
+            long_poll_seconds = _MIN_LONG_POLL_SECONDS
+        # wait 参数按整数秒发送
+        self.long_poll_seconds = int(max(0.0, long_poll_seconds))
+        self._long_poll_enabled = self.long_poll_seconds > 0
+        self._long_poll_confirmed = False
+        self._long_poll_lock = threading.Lock()
+
+        # 回调地址：配置后提交任务时附带，由服务端在任务结束时推送结果，代替频繁轮询
+        self._webhook_url = (config.get('webhook_url') or '').strip() or None
+
+        # 请求地址与请求头在实例生命周期内不变，预先构建，轮询时只拼接 task_id
+        auth = f"Bearer {self.api_key}"
+        self._create_url = f"{self.base_url}{self.endpoint_type}"
+        self._task_url_prefix = f"{self.base_url}{self.task_endpoint}/"
+        submit_headers = {
+            "Authorization": auth,
+            "Content-Type": "application/json",
+            "X-ModelScope-Async-Mode": "true",
+        }
+        if self._webhook_url:
+            submit_headers["X-ModelScope-Webhook-Url"] = self._webhook_url
+        self._submit_headers = MappingProxyType(submit_headers)
+        self._status_headers = MappingProxyType({
+            "Authorization": auth,
+            "Content-Type": "application/json",
+            "X-ModelScope-Task-Type": "image_generation",
+        })
+
+        # 提交、轮询、下载共用同一个 Session，复用 TCP/TLS 连接
+        self._session = create_session()
+
+        # 结果缓存（enable_cache 开启时）：相同参数的重复请求直接返回已生成的图片
+        self._cache = create_image_cache(config)
 
         logger.info(
             f"ModelScopeZImageGenerator 初始化完成: base_url={self.base_url}, model={self.model}, endpoint={self.endpoint_type}"
         )
 
+    def close(self) -> None:
+        """关闭底层 HTTP 连接池"""
+        self._session.close()
+
     def _normalize_prompt(self, prompt: str) -> str:
-        text = (prompt or "").strip()
-        max_chars = self.max_prompt_chars
-        if max_chars < 100:
-            max_chars = 100
+        if not prompt:
+            return ""
+        max_chars = self._effective_max_chars
+        # 常见情况：模板生成的提示词首尾无空白且未超长，直接返回，省去 strip 的拷贝
+        if len(prompt) <= max_chars and not (prompt[0].isspace() or prompt[-1].isspace()):
+            return prompt
+        text = prompt.strip()
         if len(text) <= max_chars:
             return text
         return text[:max_chars].rstrip()
@@ -71,6 +171,223 @@ class ModelScopeZImageGenerator(ImageGeneratorBase):
         model: Optional[str] = None,
         **kwargs
     ) -> bytes:
+        buffer = io.BytesIO()
+        self.generate_image_to(prompt, buffer, model=model, **kwargs)
+        return buffer.getvalue()
+
+    def generate_image_to(
+        self,
+        prompt: str,
+        sink: BinaryIO,
+        model: Optional[str] = None,
+        **kwargs
+    ) -> None:
+        cache_key = self._cache_key(prompt, model, kwargs.get("size"))
+        if cache_key is not None:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                logger.info("ModelScope Z-Image 命中结果缓存")
+                sink.write(cached)
+                return
+
+        # 提交、轮询、下载共享同一个截止时间，避免总耗时超出 max_wait_seconds
+        deadline = self.new_deadline()
+        task_id = self._submit(prompt, deadline, model=model, **kwargs)
+        if self._webhook_url:
+            image_url = self._wait_for_webhook(task_id, deadline)
+        else:
+            image_url = self._wait_for_image_url(task_id, deadline)
+
+        if cache_key is None:
+            self._download(image_url, sink, deadline)
+            return
+        buffer = io.BytesIO()
+        self._download(image_url, buffer, deadline)
+        image_data = buffer.getvalue()
+        self._cache.set(cache_key, image_data)
+        sink.write(image_data)
+
+    def _cache_key(self, prompt: str, model: Optional[str], size: Optional[str]) -> Optional[str]:
+        """计算结果缓存键，未开启缓存时返回 None"""
+        if self._cache is None:
+            return None
+        return ImageResultCache.make_key(
+            (model or self.model).strip(),
+            self._normalize_prompt(prompt),
+            self._resolve_size(size),
+        )
+
+    def generate_images(
+        self,
+        prompts: List[str],
+        concurrency: int = 5,
+        **kwargs
+    ) -> List[Union[bytes, Exception]]:
+        """
+        并发生成多张图片
+
+        每个任务按 提交 -> 轮询 -> 下载 流水线推进：提交成功立即交给进程内共用的调度线程轮询，
+        完成后立即下载，某些任务的下载与其他任务的提交、轮询重叠进行。
+        提交与下载按 concurrency 限制并发，轮询不占用工作线程。
+        开启结果缓存时，命中缓存的提示词不再提交，新生成的图片下载后写入缓存。
+
+        Args:
+            prompts: 提示词列表
+            concurrency: 提交与下载的最大并发数
+            **kwargs: 透传给提交请求的参数（如 model、size）
+
+        Returns:
+            与 prompts 顺序一致的结果列表，元素为图片二进制数据或异常
+        """
+        if not prompts:
+            return []
+
+        deadline = time.monotonic() + self.max_wait_seconds
+        results: List[Union[bytes, Exception, None]] = [None] * len(prompts)
+
+        cache_keys: List[Optional[str]] = []
+        to_submit: List[int] = []
+        for index, prompt in enumerate(prompts):
+            cache_key = self._cache_key(prompt, kwargs.get("model"), kwargs.get("size"))
+            cache_keys.append(cache_key)
+            cached = self._cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                results[index] = cached
+            else:
+                to_submit.append(index)
+        if not to_submit:
+            logger.info("ModelScope Z-Image 批量生成全部命中结果缓存")
+            return results
+
+        def _download(image_url: str, cache_key: Optional[str]) -> bytes:
+            buffer = io.BytesIO()
+            self._download(image_url, buffer, deadline)
+            image_data = buffer.getvalue()
+            if cache_key is not None:
+                self._cache.set(cache_key, image_data)
+            return image_data
+
+        executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(to_submit))))
+        timed_out = False
+        try:
+            # future -> (阶段, 结果下标)
+            pending: Dict[Future, Tuple[str, int]] = {
+                executor.submit(self._submit, prompts[index], deadline, **kwargs): ("submit", index)
+                for index in to_submit
+            }
+            while pending:
+                # 各阶段自身都受 deadline 约束，这里额外留出少量余量兜底，避免无限等待
+                timeout = max(0.0, deadline - time.monotonic()) + 5
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    timed_out = True
+                    for future, (_, index) in pending.items():
+                        future.cancel()
+                        results[index] = Exception(self._timeout_message)
+                    break
+                for future in done:
+                    stage, index = pending.pop(future)
+                    try:
+                        value = future.result()
+                    except Exception as e:
+                        results[index] = e
+                        continue
+                    if stage == "submit":
+                        pending[_SCHEDULER.submit(self, value, deadline)] = ("poll", index)
+                    elif stage == "poll":
+                        pending[executor.submit(_download, value, cache_keys[index])] = ("download", index)
+                    else:
+                        results[index] = value
+        finally:
+            # 超时后不再等待仍在进行的请求，它们各自受读超时约束，结束后结果被丢弃
+            executor.shutdown(wait=not timed_out, cancel_futures=True)
+
+        return results
+
+    def new_deadline(self) -> float:
+        """
+        创建一个 max_wait_seconds 后到期的截止时间
+
+        分阶段调用 submit / await_ready / download 时，将同一个截止时间传给各阶段，
+        即可让整个流程共享 max_wait_seconds 这一个总预算；不传时每个阶段各自拥有完整的预算。
+
+        Returns:
+            截止时间（time.monotonic）
+        """
+        return time.monotonic() + self.max_wait_seconds
+
+    def submit(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        deadline: Optional[float] = None,
+        **kwargs
+    ) -> str:
+        """
+        提交生成任务（不等待完成）
+
+        Args:
+            prompt: 提示词
+            model: 模型名称，为空时使用配置中的模型
+            deadline: 截止时间（time.monotonic，可由 new_deadline 创建），为空时为 max_wait_seconds 后
+            **kwargs: 其他参数（如 size）
+
+        Returns:
+            任务 ID
+        """
+        if deadline is None:
+            deadline = self.new_deadline()
+        return self._submit(prompt, deadline, model=model, **kwargs)
+
+    def await_ready(self, task_id: str, deadline: Optional[float] = None) -> str:
+        """
+        等待任务完成
+
+        Args:
+            task_id: submit 返回的任务 ID
+            deadline: 截止时间（time.monotonic），为空时为 max_wait_seconds 后
+
+        Returns:
+            生成图片的地址
+        """
+        if deadline is None:
+            deadline = self.new_deadline()
+        if self._webhook_url:
+            return self._wait_for_webhook(task_id, deadline)
+        return self._wait_for_image_url(task_id, deadline)
+
+    def download(self, image_url: str, deadline: Optional[float] = None) -> bytes:
+        """
+        下载生成的图片
+
+        Args:
+            image_url: await_ready 返回的图片地址
+            deadline: 截止时间（time.monotonic），为空时为 max_wait_seconds 后
+
+        Returns:
+            图片二进制数据
+        """
+        if deadline is None:
+            deadline = self.new_deadline()
+        buffer = io.BytesIO()
+        self._download(image_url, buffer, deadline)
+        return buffer.getvalue()
+
+    def _resolve_size(self, size: Optional[str]) -> str:
+        return size or self.config.get("size") or "1024x1024"
+
+    def _request_timeout(self, deadline: float, read_timeout: float) -> Tuple[float, float]:
+        """按剩余时间计算单次请求的 (connect, read) 超时，已过截止时间则直接报错"""
+        return deadline_timeout(deadline, read_timeout, self._timeout_message)
+
+    def _submit(
+        self,
+        prompt: str,
+        deadline: float,
+        model: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """提交异步生成任务，返回 task_id"""
         self.validate_config()
 
         model_id = (model or self.model).strip()
@@ -81,21 +398,24 @@ class ModelScopeZImageGenerator(ImageGeneratorBase):
             )
 
         normalized_prompt = self._normalize_prompt(prompt)
-        create_url = f"{self.base_url}{self.endpoint_type}"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "X-ModelScope-Async-Mode": "true",
-        }
+        create_url = self._create_url
         payload: Dict[str, Any] = {
             "model": model_id,
             "prompt": normalized_prompt,
             "n": 1,
-            "size": kwargs.get("size") or self.config.get("size") or "1024x1024",
+            "size": self._resolve_size(kwargs.get("size")),
         }
 
         logger.info(f"ModelScope Z-Image 提交任务: model={model_id}, url={create_url}")
-        response = requests.post(create_url, headers=headers, json=payload, timeout=60)
+        response = post_with_retry_after(
+            self._session,
+            create_url,
+            deadline=deadline,
+            read_timeout=60,
+            error_message=self._timeout_message,
+            headers=self._submit_headers,
+            data=encode_json(payload),
+        )
 
         if response.status_code != 200:
             detail = response.text[:800]
@@ -105,71 +425,398 @@ class ModelScopeZImageGenerator(ImageGeneratorBase):
                 f"错误详情: {detail}"
             )
 
-        data = response.json() or {}
+        data = decode_json(response.content) or {}
         task_id = data.get("task_id") or data.get("id")
         if not task_id:
             raise Exception(
                 "ModelScope 响应中未找到 task_id。\n"
                 f"响应片段: {str(data)[:800]}"
             )
+        return str(task_id)
 
-        task_url = f"{self.base_url}{self.task_endpoint}/{task_id}"
-        status_headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "X-ModelScope-Task-Type": "image_generation",
-        }
+    def _poll_once(
+        self,
+        task_url: str,
+        deadline: float,
+        wait: Optional[int] = None,
+        read_timeout: float = 60
+    ) -> Tuple[str, Dict[str, Any], Optional[float]]:
+        """
+        查询一次任务状态
+
+        Args:
+            task_url: 任务查询地址
+            deadline: 整体截止时间（time.monotonic）
+            wait: 长轮询等待秒数，为空时普通查询
+            read_timeout: 普通查询的读超时（秒）
+
+        Returns:
+            (任务状态, 响应数据, 服务端 Retry-After 建议的下次查询间隔)；
+            被限流（429）时按任务仍在进行中处理
+        """
+        if wait:
+            status_resp = self._session.get(
+                task_url,
+                headers=self._status_headers,
+                params={"wait": wait},
+                timeout=self._request_timeout(deadline, wait + 10),
+            )
+        else:
+            status_resp = self._session.get(
+                task_url, headers=self._status_headers, timeout=self._request_timeout(deadline, read_timeout)
+            )
+        retry_after = retry_after_seconds(status_resp.headers.get("Retry-After"))
+        if status_resp.status_code == 429:
+            return "", {}, retry_after
+        if status_resp.status_code != 200:
+            detail = status_resp.text[:800]
+            raise Exception(
+                f"ModelScope 任务查询失败 (状态码: {status_resp.status_code})\n"
+                f"请求地址: {task_url}\n"
+                f"错误详情: {detail}"
+            )
+
+        task_data = decode_json(status_resp.content) or {}
+        task_status = task_data.get("task_status") or task_data.get("status") or ""
+        return task_status, task_data, retry_after
+
+    def _resolve_task(self, task_status: str, task_data: Dict[str, Any]) -> Optional[str]:
+        """任务成功时返回图片地址，失败时抛出异常，仍在进行中返回 None"""
+        if task_status in _TERMINAL_OK or task_status.upper() in _TERMINAL_OK:
+            output_images = task_data.get("output_images") or []
+            if not isinstance(output_images, list) or not output_images:
+                raise Exception(
+                    "ModelScope 任务成功但未返回图片地址。\n"
+                    f"响应片段: {str(task_data)[:800]}"
+                )
+            image_url = output_images[0]
+            if not isinstance(image_url, str) or not image_url.strip():
+                raise Exception(
+                    "ModelScope 返回的图片地址无效。\n"
+                    f"响应片段: {str(task_data)[:800]}"
+                )
+            return image_url
 
-        deadline = time.time() + self.max_wait_seconds
+        if task_status in _TERMINAL_FAIL or task_status.upper() in _TERMINAL_FAIL:
+            error_msg = (
+                task_data.get("message")
+                or task_data.get("error")
+                or task_data.get("output")
+                or "未知错误"
+            )
+            raise Exception(f"ModelScope 图片生成失败: {error_msg}")
+
+        return None
+
+    def _wait_for_image_url(self, task_id: str, deadline: float) -> str:
+        """在当前线程中轮询任务直至完成，返回图片地址"""
+        task_url = self._task_url_prefix + task_id
         last_status: Optional[str] = None
+        interval = self.initial_poll_interval
         while True:
-            if time.time() > deadline:
+            if time.monotonic() > deadline:
                 raise Exception(
                     f"ModelScope 任务超时（{self.max_wait_seconds}s）。task_id={task_id}, last_status={last_status}"
                 )
 
-            status_resp = requests.get(task_url, headers=status_headers, timeout=60)
-            if status_resp.status_code != 200:
-                detail = status_resp.text[:800]
-                raise Exception(
-                    f"ModelScope 任务查询失败 (状态码: {status_resp.status_code})\n"
-                    f"请求地址: {task_url}\n"
-                    f"错误详情: {detail}"
-                )
+            long_polled = False
+            server_waited = False
+            task_status: Optional[str] = None
+            retry_after: Optional[float] = None
+            # 剩余时间不足一个长轮询窗口时改用普通轮询，避免越过截止时间
+            if self._long_poll_enabled and deadline - time.monotonic() > self.long_poll_seconds:
+                started = time.monotonic()
+                try:
+                    task_status, task_data, retry_after = self._poll_once(
+                        task_url, deadline, wait=self.long_poll_seconds
+                    )
+                except requests.RequestException as e:
+                    # 网络抖动不代表服务端不支持，本轮改用普通轮询即可
+                    logger.info(f"ModelScope 长轮询请求异常，本轮改用普通轮询: {str(e)[:200]}")
+                except Exception as e:
+                    self._disable_long_poll(f"长轮询请求失败: {str(e)[:200]}", force=True)
+                else:
+                    long_polled = True
+                    # 服务端至少保持了大部分等待窗口，才算确认支持长轮询
+                    server_waited = time.monotonic() - started >= self.long_poll_seconds * 0.8
+                    if server_waited:
+                        with self._long_poll_lock:
+                            self._long_poll_confirmed = True
 
-            task_data = status_resp.json() or {}
-            task_status = (task_data.get("task_status") or task_data.get("status") or "").upper()
+            if task_status is None:
+                task_status, task_data, retry_after = self._poll_once(task_url, deadline)
             last_status = task_status or last_status
 
-            if task_status == "SUCCEED":
-                output_images = task_data.get("output_images") or []
-                if not isinstance(output_images, list) or not output_images:
-                    raise Exception(
-                        "ModelScope 任务成功但未返回图片地址。\n"
-                        f"响应片段: {str(task_data)[:800]}"
-                    )
-                image_url = output_images[0]
-                if not isinstance(image_url, str) or not image_url.strip():
-                    raise Exception(
-                        "ModelScope 返回的图片地址无效。\n"
-                        f"响应片段: {str(task_data)[:800]}"
-                    )
-                img_resp = requests.get(image_url, timeout=120)
-                if img_resp.status_code != 200:
+            image_url = self._resolve_task(task_status, task_data)
+            if image_url:
+                return image_url
+
+            if server_waited and retry_after is None:
+                continue
+            if long_polled and retry_after is None:
+                self._disable_long_poll("服务端未等待 wait 参数")
+
+            # 服务端给出 Retry-After 时以其为准，否则按指数退避
+            if retry_after is not None:
+                delay = retry_after
+            else:
+                delay = interval + random.uniform(0, 0.25 * interval)
+                interval = min(self.max_poll_interval, interval * 1.5)
+            time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+    def _disable_long_poll(self, reason: str, force: bool = False) -> None:
+        """关闭长轮询；force 为 False 时，已确认服务端支持长轮询则保持开启"""
+        with self._long_poll_lock:
+            if not self._long_poll_enabled or (self._long_poll_confirmed and not force):
+                return
+            self._long_poll_enabled = False
+        logger.info(f"ModelScope {reason}，回退为普通轮询")
+
+    def _wait_for_webhook(self, task_id: str, deadline: float) -> str:
+        """
+        等待任务回调，返回图片地址
+
+        收到回调后立即查询一次任务状态确认结果（不直接使用回调内容）；
+        每等待 max_poll_interval 秒仍未收到回调时也主动查询一次，
+        回调丢失或地址不可达时也能在截止时间内拿到结果。
+        """
+        task_url = self._task_url_prefix + task_id
+        woken = threading.Event()
+        _register_webhook(task_id, woken.set)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
                     raise Exception(
-                        f"下载图片失败 (状态码: {img_resp.status_code})\n"
-                        f"图片地址: {image_url}\n"
-                        f"错误详情: {img_resp.text[:200]}"
+                        f"ModelScope 任务超时（{self.max_wait_seconds}s）。task_id={task_id}, 未收到回调"
                     )
-                return img_resp.content
-
-            if task_status == "FAILED":
-                error_msg = (
-                    task_data.get("message")
-                    or task_data.get("error")
-                    or task_data.get("output")
-                    or "未知错误"
+                woken.wait(timeout=min(self.max_poll_interval, remaining))
+                woken.clear()
+                task_status, task_data, _ = self._poll_once(task_url, deadline)
+
+                image_url = self._resolve_task(task_status, task_data)
+                if image_url:
+                    return image_url
+        finally:
+            _unregister_webhook(task_id)
+
+    def _download(self, image_url: str, sink: BinaryIO, deadline: float) -> None:
+        """流式下载图片并写入 sink"""
+        timeout = self._request_timeout(deadline, 120)
+        with self._session.get(image_url, stream=True, timeout=timeout) as img_resp:
+            if img_resp.status_code != 200:
+                raise Exception(
+                    f"下载图片失败 (状态码: {img_resp.status_code})\n"
+                    f"图片地址: {image_url}\n"
+                    f"错误详情: {img_resp.text[:200]}"
                 )
-                raise Exception(f"ModelScope 图片生成失败: {error_msg}")
+            img_resp.raw.decode_content = True
+            shutil.copyfileobj(img_resp.raw, sink, 1 << 16)
+
+
+def _register_webhook(task_id: str, wake: Callable[[], None]) -> None:
+    """登记等待回调的任务；回调已先行到达时立即唤醒"""
+    with _WEBHOOK_LOCK:
+        received = _EARLY_WEBHOOKS.pop(task_id, None)
+        _WEBHOOK_WAITERS[task_id] = wake
+    if received is not None and time.monotonic() - received <= _EARLY_WEBHOOK_TTL:
+        wake()
+
+
+def _unregister_webhook(task_id: str) -> None:
+    with _WEBHOOK_LOCK:
+        _WEBHOOK_WAITERS.pop(task_id, None)
+
+
+def resolve_webhook(data: Dict[str, Any]) -> bool:
+    """
+    处理 ModelScope 任务回调
+
+    回调接口无法验证来源，因此回调只作为唤醒信号：等待中的任务收到后立即查询一次任务状态，
+    图片地址以查询结果为准。只处理终态（成功/失败）回调；尚未登记的任务只记录 task_id，
+    供随后登记时立即唤醒。
+
+    Args:
+        data: 回调请求体，需包含 task_id 与 task_status
+
+    Returns:
+        是否唤醒了等待中的任务
+    """
+    if not isinstance(data, dict):
+        return False
+    task_id = data.get("task_id") or data.get("id")
+    task_status = str(data.get("task_status") or data.get("status") or "").upper()
+    if not task_id or task_status not in _TERMINAL_OK | _TERMINAL_FAIL:
+        return False
+
+    task_id = str(task_id)
+    now = time.monotonic()
+    with _WEBHOOK_LOCK:
+        wake = _WEBHOOK_WAITERS.get(task_id)
+        if wake is None:
+            _EARLY_WEBHOOKS[task_id] = now
+            _EARLY_WEBHOOKS.move_to_end(task_id)
+            while _EARLY_WEBHOOKS and (
+                len(_EARLY_WEBHOOKS) > _EARLY_WEBHOOK_MAX
+                or now - next(iter(_EARLY_WEBHOOKS.values())) > _EARLY_WEBHOOK_TTL
+            ):
+                _EARLY_WEBHOOKS.popitem(last=False)
+            return False
+    wake()
+    return True
+
+
+class _PollScheduler:
+    """
+    任务轮询调度器
+
+    进程内所有 ModelScope 生成器共用一个实例：按下次轮询时间维护一个最小堆，
+    由一个调度线程取出到期的任务，交给小型线程池并发查询，任务结束时通过 Future 返回图片地址或异常。
+    每次唤醒会把 _COALESCE_WINDOW 内到期的任务一并取出同时发出查询；
+    查询使用较短的读超时，单个缓慢的请求不会拖住其他任务。
+    队列清空后调度线程自动退出，有新任务时再启动。
+    """
+
+    # 合并轮询的时间窗口（秒）：窗口内即将到期的任务随本批一起查询
+    _COALESCE_WINDOW = 0.2
+    # 并发查询的线程数
+    _POLL_WORKERS = 8
+    # 单次查询的读超时（秒）；超时视为临时错误，按退避稍后重试
+    _POLL_READ_TIMEOUT = 10
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, int, Dict[str, Any]]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._executor = ThreadPoolExecutor(max_workers=self._POLL_WORKERS, thread_name_prefix="modelscope-poll")
+
+    def submit(self, generator: ModelScopeZImageGenerator, task_id: str, deadline: float) -> Future:
+        """登记一个已提交的任务，返回在任务结束时完成的 Future"""
+        job = {
+            "generator": generator,
+            "task_id": task_id,
+            "task_url": generator._task_url_prefix + task_id,
+            "deadline": deadline,
+            "future": Future(),
+            "interval": generator.initial_poll_interval,
+            "last_status": None,
+            "generation": 0,
+            "polling": False,
+            "woken": False,
+        }
+        with self._cond:
+            self._push(time.monotonic() + job["interval"], job)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="modelscope-poll-scheduler", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+        if generator._webhook_url:
+            _register_webhook(task_id, lambda: self._wake(job))
+        return job["future"]
+
+    def _push(self, due: float, job: Dict[str, Any]) -> None:
+        # 每次入堆都会使该任务此前的堆条目失效，避免回调唤醒后重复轮询
+        job["generation"] += 1
+        heapq.heappush(self._heap, (due, next(self._counter), job["generation"], job))
+
+    def _wake(self, job: Dict[str, Any]) -> None:
+        """收到任务回调时，让该任务立即轮询一次"""
+        with self._cond:
+            if job["future"].done():
+                return
+            if job["polling"]:
+                # 查询进行中，结束后立即再查一次
+                job["woken"] = True
+                return
+            self._push(time.monotonic(), job)
+            self._cond.notify()
+
+    def _finish(self, job: Dict[str, Any]) -> None:
+        if job["generator"]._webhook_url:
+            _unregister_webhook(job["task_id"])
+
+    def _settle(self, job: Dict[str, Any], result: Optional[str] = None, error: Optional[Exception] = None) -> None:
+        """结束任务；调用方已取消 Future（如批量生成超时）时直接丢弃结果"""
+        self._finish(job)
+        try:
+            if error is not None:
+                job["future"].set_exception(error)
+            else:
+                job["future"].set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._worker = None
+                        return
+                    delay = self._heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+
+                batch = []
+                horizon = time.monotonic() + self._COALESCE_WINDOW
+                while self._heap and self._heap[0][0] <= horizon:
+                    _, _, generation, job = heapq.heappop(self._heap)
+                    if generation == job["generation"]:
+                        job["polling"] = True
+                        batch.append(job)
+
+            for job in batch:
+                self._executor.submit(self._poll, job)
+
+    def _poll(self, job: Dict[str, Any]) -> None:
+        generator: ModelScopeZImageGenerator = job["generator"]
+        future: Future = job["future"]
+        if future.done():
+            self._finish(job)
+            return
+        if time.monotonic() > job["deadline"]:
+            self._settle(job, error=Exception(
+                f"ModelScope 任务超时（{generator.max_wait_seconds}s）。"
+                f"task_id={job['task_id']}, last_status={job['last_status']}"
+            ))
+            return
+
+        retry_after: Optional[float] = None
+        try:
+            task_status, task_data, retry_after = generator._poll_once(
+                job["task_url"], job["deadline"], read_timeout=self._POLL_READ_TIMEOUT
+            )
+            job["last_status"] = task_status or job["last_status"]
+            image_url = generator._resolve_task(task_status, task_data)
+        except requests.RequestException as e:
+            # 网络错误或读超时：不判定任务失败，按退避稍后重试
+            logger.debug(f"ModelScope 任务查询异常，稍后重试: task_id={job['task_id']}, error={str(e)[:200]}")
+            image_url = None
+        except Exception as e:
+            self._settle(job, error=e)
+            return
+        if image_url:
+            self._settle(job, result=image_url)
+            return
+
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            interval = job["interval"]
+            delay = interval + random.uniform(0, 0.25 * interval)
+            job["interval"] = min(generator.max_poll_interval, interval * 1.5)
+        with self._cond:
+            job["polling"] = False
+            if job["woken"]:
+                job["woken"] = False
+                delay = 0.0
+            self._push(min(time.monotonic() + delay, job["deadline"]), job)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="modelscope-poll-scheduler", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+
 
-            time.sleep(self.poll_interval_seconds)
+_SCHEDULER = _PollScheduler()
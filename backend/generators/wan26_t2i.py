@@ -1,28 +1,35 @@
 """通义万相 Wan2.6 文生图生成器"""
 import logging
-import base64
-import requests
-from typing import Dict, Any, Optional
+import binascii
+import time
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Tuple
 
 from .base import ImageGeneratorBase
+from ..utils.http_session import create_session, deadline_timeout, decode_json, encode_json, post_with_retry_after
+from ..utils.image_cache import ImageResultCache, create_image_cache
 
 logger = logging.getLogger(__name__)
 
 
+_ASPECT_RATIOS: Mapping[str, str] = MappingProxyType({
+    "1:1": "1280*1280",
+    "2:3": "800*1200",
+    "3:2": "1200*800",
+    "3:4": "960*1280",
+    "4:3": "1280*960",
+    "9:16": "720*1280",
+    "16:9": "1280*720",
+    "21:9": "1344*576",
+})
+
+
 def _aspect_ratio_to_size(aspect_ratio: str) -> str:
-    mapping = {
-        "1:1": "1280*1280",
-        "2:3": "800*1200",
-        "3:2": "1200*800",
-        "3:4": "960*1280",
-        "4:3": "1280*960",
-        "9:16": "720*1280",
-        "16:9": "1280*720",
-        "21:9": "1344*576",
-    }
-    return mapping.get(aspect_ratio, "1280*1280")
+    return _ASPECT_RATIOS.get(aspect_ratio, "1280*1280")
 
 
+@lru_cache(maxsize=64)
 def _normalize_size(size: Optional[str], aspect_ratio: str) -> str:
     if not size:
         return _aspect_ratio_to_size(aspect_ratio)
@@ -36,40 +43,47 @@ def _normalize_size(size: Optional[str], aspect_ratio: str) -> str:
     return _aspect_ratio_to_size(aspect_ratio)
 
 
+# 响应中图片地址 / base64 数据可能使用的字段名（按优先级排列）
+_URL_KEYS = ("image", "image_url", "url")
+_B64_KEYS = ("b64_json", "b64", "base64")
+
+
+def _first_value(part: Dict[str, Any], keys: Tuple[str, ...]) -> Optional[str]:
+    for key in keys:
+        value = part.get(key)
+        if value:
+            return value
+    return None
+
+
 def _extract_image_url_or_b64(data: Dict[str, Any]) -> Dict[str, Optional[str]]:
     output = (data.get("output") or {}) if isinstance(data, dict) else {}
+    if not isinstance(output, dict):
+        raise Exception(f"通义万相响应格式异常，output 不是对象: {str(output)[:200]}")
 
     results = output.get("results")
     if isinstance(results, list) and results:
         first = results[0] or {}
         if isinstance(first, dict):
-            return {
-                "url": first.get("url"),
-                "b64": first.get("b64_json") or first.get("b64") or first.get("base64"),
-            }
-
-    choices = output.get("choices")
-    if isinstance(choices, list) and choices:
-        for choice in choices:
-            if not isinstance(choice, dict):
+            return {"url": first.get("url"), "b64": _first_value(first, _B64_KEYS)}
+
+    for choice in output.get("choices") or ():
+        if not isinstance(choice, dict):
+            continue
+        message = choice.get("message")
+        if not isinstance(message, dict):
+            continue
+        content = message.get("content")
+        parts = (content,) if isinstance(content, dict) else content
+        if not isinstance(parts, (list, tuple)):
+            continue
+        for part in parts:
+            if not isinstance(part, dict):
                 continue
-            message = choice.get("message") or {}
-            if not isinstance(message, dict):
-                continue
-            content = message.get("content")
-            if isinstance(content, list):
-                for part in content:
-                    if not isinstance(part, dict):
-                        continue
-                    url = part.get("image") or part.get("image_url") or part.get("url")
-                    b64 = part.get("b64_json") or part.get("b64") or part.get("base64")
-                    if url or b64:
-                        return {"url": url, "b64": b64}
-            elif isinstance(content, dict):
-                url = content.get("image") or content.get("image_url") or content.get("url")
-                b64 = content.get("b64_json") or content.get("b64") or content.get("base64")
-                if url or b64:
-                    return {"url": url, "b64": b64}
+            url = _first_value(part, _URL_KEYS)
+            b64 = _first_value(part, _B64_KEYS)
+            if url or b64:
+                return {"url": url, "b64": b64}
 
     return {"url": None, "b64": None}
 
@@ -101,10 +115,31 @@ class Wan26T2IGenerator(ImageGeneratorBase):
         self.default_aspect_ratio = config.get("default_aspect_ratio", "3:4")
         self.prompt_extend = bool(config.get("prompt_extend", True))
         self.watermark = bool(config.get("watermark", False))
+        # 请求服务端返回图片地址而不是 base64（附带 response_format=url），响应体更小且省去编解码。
+        # 该参数尚未在 multimodal-generation 接口上验证，默认关闭
+        self.prefer_url_response = bool(config.get("prefer_url_response", False))
         self.default_timeout_seconds = int(config.get("timeout_seconds", 120))
+        self._timeout_message = f"通义万相请求超时（{self.default_timeout_seconds}s）"
+
+        # 请求地址与请求头在实例生命周期内不变，预先构建
+        self._url = f"{self.base_url}{self.endpoint_path}"
+        self._headers = MappingProxyType({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        })
+
+        # 生成请求与图片下载共用同一个 Session，复用 TCP/TLS 连接
+        self._session = create_session()
+
+        # 结果缓存（enable_cache 开启时）：相同参数的重复请求直接返回已生成的图片
+        self._cache = create_image_cache(config)
 
         logger.info(f"Wan26T2IGenerator 初始化完成: base_url={self.base_url}, model={self.model}")
 
+    def close(self) -> None:
+        """关闭底层 HTTP 连接池"""
+        self._session.close()
+
     def validate_config(self) -> bool:
         if not self.api_key:
             raise ValueError(
@@ -136,7 +171,17 @@ class Wan26T2IGenerator(ImageGeneratorBase):
         final_prompt_extend = self.prompt_extend if prompt_extend is None else bool(prompt_extend)
         final_watermark = self.watermark if watermark is None else bool(watermark)
 
-        url = f"{self.base_url}{self.endpoint_path}"
+        cache_key: Optional[str] = None
+        if self._cache is not None:
+            cache_key = ImageResultCache.make_key(
+                model, prompt, final_size, negative_prompt, final_prompt_extend, final_watermark
+            )
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                logger.info("通义万相命中结果缓存")
+                return cached
+
+        url = self._url
         payload = {
             "model": model,
             "input": {
@@ -155,14 +200,21 @@ class Wan26T2IGenerator(ImageGeneratorBase):
                 "size": final_size,
             },
         }
-
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+        if self.prefer_url_response:
+            payload["parameters"]["response_format"] = "url"
 
         logger.info(f"通义万相生成图片: model={model}, size={final_size}")
-        resp = requests.post(url, headers=headers, json=payload, timeout=self.default_timeout_seconds)
+        # 生成请求、限流重试与图片下载共享 timeout_seconds 这一个总预算
+        deadline = time.monotonic() + self.default_timeout_seconds
+        resp = post_with_retry_after(
+            self._session,
+            url,
+            deadline=deadline,
+            read_timeout=self.default_timeout_seconds,
+            error_message=self._timeout_message,
+            headers=self._headers,
+            data=encode_json(payload),
+        )
 
         if resp.status_code != 200:
             detail = (resp.text or "")[:500]
@@ -172,20 +224,28 @@ class Wan26T2IGenerator(ImageGeneratorBase):
                 f"请求地址: {url}"
             )
 
-        data = resp.json() if resp.content else {}
+        data = decode_json(resp.content)
         extracted = _extract_image_url_or_b64(data)
         image_url = extracted.get("url")
         b64_data = extracted.get("b64")
 
         if image_url:
-            img_resp = requests.get(image_url, timeout=60)
+            img_resp = self._session.get(image_url, timeout=deadline_timeout(deadline, 60, self._timeout_message))
             if img_resp.status_code != 200:
                 raise Exception(f"通义万相图片下载失败 (HTTP {img_resp.status_code})")
-            return img_resp.content
-
-        if b64_data:
-            if isinstance(b64_data, str) and b64_data.startswith("data:"):
-                b64_data = b64_data.split(",", 1)[1]
-            return base64.b64decode(b64_data)
-
-        raise Exception(f"通义万相响应中未找到图片结果: {str(data)[:500]}")
+            image_data = img_resp.content
+        elif b64_data:
+            if isinstance(b64_data, str):
+                if b64_data.startswith("data:"):
+                    idx = b64_data.find(",", 5)
+                    if idx < 0:
+                        raise Exception(f"通义万相返回的 data URI 缺少数据部分: {b64_data[:100]}")
+                    b64_data = b64_data[idx + 1:]
+                b64_data = b64_data.encode("ascii")
+            image_data = binascii.a2b_base64(b64_data)
+        else:
+            raise Exception(f"通义万相响应中未找到图片结果: {str(data)[:500]}")
+
+        if cache_key is not None:
+            self._cache.set(cache_key, image_data)
+        return image_data
@@ -7,6 +7,7 @@
 - 重试/重新生成单张图片
 - 批量重试失败图片
 - 获取任务状态
+- 接收 ModelScope 任务回调
 """
 
 import os
@@ -15,6 +16,7 @@ import base64
 import logging
 from flask import Blueprint, request, jsonify, Response, send_file
 from backend.services.image import get_image_service
+from backend.generators.modelscope_z_image import resolve_webhook
 from .utils import log_request, log_error
 
 logger = logging.getLogger(__name__)
@@ -375,6 +377,32 @@ def create_image_blueprint():
                 "error": f"获取任务状态失败。\n错误详情: {error_msg}"
             }), 500
 
+    # ==================== 服务商回调 ====================
+
+    @image_bp.route('/modelscope/callback', methods=['POST'])
+    def modelscope_callback():
+        """
+        ModelScope 任务回调（服务商配置了 webhook_url 时使用）
+
+        请求体：
+        - task_id: 任务 ID
+        - task_status: 任务状态
+        - output_images: 图片地址列表（成功时）
+
+        返回：
+        - success: 是否处理成功
+        - accepted: 是否有等待中的生成任务接收了该回调
+        """
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = {}
+        accepted = resolve_webhook(data)
+        logger.debug(f"ModelScope 回调: task_id={data.get('task_id')}, accepted={accepted}")
+        return jsonify({
+            "success": True,
+            "accepted": accepted
+        }), 200
+
     # ==================== 健康检查 ====================
 
     @image_bp.route('/health', methods=['GET'])
@@ -0,0 +1,180 @@
+"""HTTP 会话工具"""
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时回退到标准库 json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def create_session(pool_connections: int = 8, pool_maxsize: int = 32) -> requests.Session:
+    """
+    创建带连接池与自动重试的 requests 会话
+
+    会话复用 keep-alive 连接，避免每次请求重新进行 TCP/TLS 握手。
+    对 500/502/503/504 只重试幂等请求（GET 等），POST 提交不会被重复发送。
+    连接失败与读超时不重试：调用方按剩余时间设置的超时即是单次请求的真实上限。
+    429 与 Retry-After 不在此处理（不会在 urllib3 内部休眠），交由调用方按截止时间自行决定等待。
+    注意：不在会话上设置 Authorization，以免下载第三方图片地址时泄露 API Key。
+
+    Args:
+        pool_connections: 缓存的连接池数量（按主机区分）
+        pool_maxsize: 每个连接池的最大连接数
+
+    Returns:
+        配置好的 requests.Session
+    """
+    retry = Retry(
+        total=3,
+        connect=0,
+        read=0,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def encode_json(payload: Any) -> bytes:
+    """
+    将请求体序列化为紧凑的 UTF-8 JSON
+
+    与 requests 的 json= 参数相比，不转义非 ASCII 字符、去掉分隔符空格，
+    中文提示词的请求体约为原来的一半；安装了 orjson 时使用 orjson 序列化。
+    调用方需自行设置 Content-Type: application/json。
+
+    Args:
+        payload: 可 JSON 序列化的对象
+
+    Returns:
+        UTF-8 编码的 JSON 字节串
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+def decode_json(content: bytes) -> Any:
+    """
+    解析响应体 JSON
+
+    安装了 orjson 时直接解析原始字节，省去 UTF-8 解码与纯 Python 解析的开销，
+    对内嵌 base64 图片的大响应尤其明显；否则回退到标准库 json。
+
+    Args:
+        content: 响应体原始字节，为空时视为空对象
+
+    Returns:
+        解析后的对象
+    """
+    if not content:
+        return {}
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 响应头
+
+    支持秒数（如 "5"）与 HTTP 日期（如 "Wed, 21 Oct 2026 07:28:00 GMT"）两种格式。
+
+    Args:
+        value: Retry-After 头的值
+
+    Returns:
+        建议等待的秒数（不小于 0）；头不存在或无法解析时返回 None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def deadline_timeout(deadline: float, read_timeout: float, error_message: str) -> Tuple[float, float]:
+    """
+    按剩余时间计算单次请求的 (connect, read) 超时
+
+    Args:
+        deadline: 截止时间（time.monotonic）
+        read_timeout: 读超时上限（秒）
+        error_message: 已过截止时间时抛出的异常信息
+
+    Returns:
+        (connect, read) 超时，均不超过剩余时间
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise Exception(error_message)
+    return (min(10.0, remaining), min(read_timeout, remaining))
+
+
+def post_with_retry_after(
+    session: requests.Session,
+    url: str,
+    *,
+    deadline: float,
+    read_timeout: float,
+    error_message: str,
+    **kwargs: Any
+) -> requests.Response:
+    """
+    发送 POST 请求；被限流（429）且服务端给出 Retry-After 时，按其等待后重试一次
+
+    等待后仍会超过截止时间时不再重试，直接返回 429 响应，由调用方按失败处理。
+
+    Args:
+        session: HTTP 会话
+        url: 请求地址
+        deadline: 截止时间（time.monotonic），请求超时与重试等待均受其约束
+        read_timeout: 读超时上限（秒）
+        error_message: 已过截止时间时抛出的异常信息
+        **kwargs: 透传给 session.post 的参数（如 headers、data）
+
+    Returns:
+        最后一次请求的响应
+    """
+    for attempt in range(2):
+        response = session.post(url, timeout=deadline_timeout(deadline, read_timeout, error_message), **kwargs)
+        retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+        if (
+            response.status_code != 429
+            or retry_after is None
+            or attempt > 0
+            or time.monotonic() + retry_after >= deadline
+        ):
+            break
+        logger.warning(f"请求被限流，{retry_after:.1f} 秒后重试: {url}")
+        time.sleep(retry_after)
+    return response
@@ -0,0 +1,142 @@
+"""图片生成结果缓存"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 缓存文件名即缓存键（32 位十六进制）；淘汰时只处理此类文件，不碰目录中的其他文件
+_KEY_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+class ImageResultCache:
+    """
+    图片生成结果缓存
+
+    以 (模型, 提示词, 尺寸, 其他参数) 的摘要为键，内存中按 LRU 保留最近的结果；
+    配置了 cache_dir 时同时写入磁盘，进程重启后仍可命中；
+    磁盘文件数超过 max_disk_items 时按最近访问时间淘汰最旧的文件。
+    """
+
+    def __init__(self, max_items: int = 128, cache_dir: Optional[str] = None, max_disk_items: int = 1024):
+        """
+        初始化缓存
+
+        Args:
+            max_items: 内存中最多保留的图片数量
+            cache_dir: 磁盘缓存目录，为空时只使用内存缓存
+            max_disk_items: 磁盘中最多保留的图片数量
+        """
+        self.max_items = max(1, max_items)
+        self.cache_dir = cache_dir
+        self.max_disk_items = max(1, max_disk_items)
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """根据生成参数计算缓存键"""
+        # 以 JSON 数组编码各参数，避免参数中含分隔符时不同组合拼出相同的字符串
+        raw = json.dumps([None if part is None else str(part) for part in parts], ensure_ascii=False)
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                return data
+
+        if not self.cache_dir:
+            return None
+        path = os.path.join(self.cache_dir, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            # 更新修改时间，作为磁盘淘汰的访问顺序
+            os.utime(path)
+        except OSError:
+            pass
+        self._remember(key, data)
+        return data
+
+    def set(self, key: str, data: bytes) -> None:
+        """写入缓存"""
+        self._remember(key, data)
+        if not self.cache_dir:
+            return
+        path = os.path.join(self.cache_dir, key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入图片磁盘缓存失败: {e}")
+            return
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """磁盘缓存文件数超出上限时删除最久未访问的文件"""
+        try:
+            entries = [
+                entry for entry in os.scandir(self.cache_dir)
+                if _KEY_PATTERN.fullmatch(entry.name) and entry.is_file()
+            ]
+        except OSError:
+            return
+        excess = len(entries) - self.max_disk_items
+        if excess <= 0:
+            return
+        entries.sort(key=_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _remember(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+def _mtime(entry: os.DirEntry) -> float:
+    try:
+        return entry.stat().st_mtime
+    except OSError:  # 文件已被其他线程淘汰
+        return 0.0
+
+
+def create_image_cache(config: Dict[str, Any]) -> Optional[ImageResultCache]:
+    """
+    根据服务商配置创建结果缓存
+
+    缓存需显式开启（enable_cache: true），避免期望每次得到不同结果的调用方被意外命中。
+
+    Args:
+        config: 服务商配置字典（enable_cache / cache_dir / cache_max_items / cache_max_disk_items）
+
+    Returns:
+        缓存实例；未开启时返回 None
+    """
+    if not config.get('enable_cache'):
+        return None
+    return ImageResultCache(
+        max_items=int(config.get('cache_max_items') or 128),
+        cache_dir=config.get('cache_dir') or None,
+        max_disk_items=int(config.get('cache_max_disk_items') or 1024),
+    )
@@ -1,9 +1,14 @@
 """
 pytest 配置和共享 fixtures
 """
+import io
+import json
 import os
 import sys
+import threading
+import time
 import pytest
+import requests
 import tempfile
 import shutil
 
@@ -78,3 +83,131 @@ def sample_history_record():
         "created_at": "2025-01-01T00:00:00",
         "updated_at": "2025-01-01T00:00:00"
     }
+
+
+class FakeResponse:
+    """模拟 requests.Response 的最小实现"""
+
+    def __init__(self, status_code=200, data=None, body=None, headers=None):
+        self.status_code = status_code
+        self.content = body if body is not None else json.dumps(data or {}).encode("utf-8")
+        self.text = self.content.decode("utf-8", errors="replace")
+        self.headers = headers or {}
+        self.raw = io.BytesIO(self.content)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class FakeModelScopeSession:
+    """
+    模拟 ModelScope 接口的 HTTP 会话
+
+    - POST 提交返回递增的 task_id（t1, t2, ...）
+    - 任务第 polls_needed 次查询时成功，返回 https://img.example/<task_id>
+    - failing 中的任务查询即返回 FAILED
+    - hanging 中的任务查询不响应，等满读超时后抛出 ReadTimeout
+    - 下载图片返回 b"IMG-<task_id>"
+    """
+
+    def __init__(self, polls_needed=2, failing=(), hanging=()):
+        self.polls_needed = polls_needed
+        self.failing = set(failing)
+        self.hanging = set(hanging)
+        self.submitted = 0
+        self.polls = {}
+        self.downloads = []
+        self._lock = threading.Lock()
+
+    def post(self, url, **kwargs):
+        with self._lock:
+            self.submitted += 1
+            task_id = f"t{self.submitted}"
+        return FakeResponse(data={"task_id": task_id})
+
+    def get(self, url, **kwargs):
+        if url.startswith("https://img.example/"):
+            self.downloads.append(url)
+            return FakeResponse(body=b"IMG-" + url.rsplit("/", 1)[-1].encode())
+        task_id = url.rsplit("/", 1)[-1]
+        with self._lock:
+            count = self.polls[task_id] = self.polls.get(task_id, 0) + 1
+        if task_id in self.hanging:
+            time.sleep(kwargs["timeout"][1])
+            raise requests.ReadTimeout(f"hanging task {task_id}")
+        if task_id in self.failing:
+            return FakeResponse(data={"task_status": "FAILED", "message": "boom"})
+        if count >= self.polls_needed:
+            return FakeResponse(data={
+                "task_status": "SUCCEED",
+                "output_images": [f"https://img.example/{task_id}"],
+            })
+        return FakeResponse(data={"task_status": "RUNNING"})
+
+    def close(self):
+        pass
+
+
+class FakeWanSession:
+    """
+    模拟通义万相接口的 HTTP 会话
+
+    - POST 依次返回 responses 中的响应，用完后重复最后一个；默认返回图片地址 https://img.example/wan
+    - 下载图片返回 image
+    - posts / downloads 记录每次请求
+    """
+
+    def __init__(self, responses=None, image=b"WAN-IMG"):
+        self.responses = list(responses or [FakeResponse(data={
+            "output": {"choices": [{"message": {"content": [{"image": "https://img.example/wan"}]}}]}
+        })])
+        self.image = image
+        self.posts = []
+        self.downloads = []
+
+    def post(self, url, **kwargs):
+        self.posts.append(kwargs)
+        if len(self.responses) > 1:
+            return self.responses.pop(0)
+        return self.responses[0]
+
+    def get(self, url, **kwargs):
+        self.downloads.append(url)
+        return FakeResponse(body=self.image)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def make_modelscope_generator():
+    """创建使用模拟会话的 ModelScope 生成器（工厂函数）"""
+    from backend.generators.modelscope_z_image import ModelScopeZImageGenerator
+
+    def _make(session=None, **config):
+        generator = ModelScopeZImageGenerator({
+            "api_key": "test-key",
+            "initial_poll_interval_seconds": 0.01,
+            "max_poll_interval_seconds": 0.05,
+            **config,
+        })
+        generator._session = session or FakeModelScopeSession()
+        return generator
+
+    return _make
+
+
+@pytest.fixture
+def make_wan_generator():
+    """创建使用模拟会话的通义万相生成器（工厂函数）"""
+    from backend.generators.wan26_t2i import Wan26T2IGenerator
+
+    def _make(session=None, **config):
+        generator = Wan26T2IGenerator({"api_key": "test-key", **config})
+        generator._session = session or FakeWanSession()
+        return generator
+
+    return _make
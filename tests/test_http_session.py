@@ -0,0 +1,140 @@
+"""
+HTTP 会话工具测试
+"""
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import requests
+
+from backend.utils.http_session import (
+    create_session,
+    deadline_timeout,
+    decode_json,
+    encode_json,
+    post_with_retry_after,
+    retry_after_seconds,
+)
+from tests.conftest import FakeResponse, FakeWanSession
+
+
+def test_retry_after_seconds_form():
+    """秒数格式"""
+    assert retry_after_seconds("5") == 5.0
+    assert retry_after_seconds(" 1.5 ") == 1.5
+    assert retry_after_seconds("-3") == 0.0
+
+
+def test_retry_after_http_date_form():
+    """HTTP 日期格式：未来时间返回剩余秒数，过去时间返回 0"""
+    future = datetime.now(timezone.utc) + timedelta(seconds=30)
+    waited = retry_after_seconds(format_datetime(future, usegmt=True))
+    assert 25 <= waited <= 30
+
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_retry_after_missing_or_invalid():
+    """头不存在或无法解析时返回 None"""
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds("") is None
+    assert retry_after_seconds("soon") is None
+
+
+def test_json_round_trip_keeps_non_ascii():
+    """序列化结果紧凑、不转义中文，且可原样解析"""
+    payload = {"prompt": "一只猫", "n": 1}
+    body = encode_json(payload)
+
+    assert isinstance(body, bytes)
+    assert "一只猫".encode("utf-8") in body
+    assert b": " not in body
+    assert decode_json(body) == payload
+
+
+def test_decode_json_empty_content():
+    """空响应体解析为空对象"""
+    assert decode_json(b"") == {}
+    assert decode_json(None) == {}
+
+
+def test_hanging_get_fails_within_one_timeout():
+    """服务端不响应时只发起一次连接，并在一个读超时内失败"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(8)
+    port = server.getsockname()[1]
+    server.settimeout(0.1)
+    accepted = []
+    stop = threading.Event()
+
+    def accept():
+        while not stop.is_set():
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                continue
+            accepted.append(conn)
+
+    thread = threading.Thread(target=accept, daemon=True)
+    thread.start()
+    session = create_session()
+    try:
+        started = time.monotonic()
+        with pytest.raises(requests.RequestException):
+            session.get(f"http://127.0.0.1:{port}/", timeout=(1, 0.5))
+        elapsed = time.monotonic() - started
+    finally:
+        session.close()
+        stop.set()
+        thread.join()
+        server.close()
+        for conn in accepted:
+            conn.close()
+
+    assert elapsed < 1.0
+    assert len(accepted) == 1
+
+
+def test_post_retries_once_after_retry_after():
+    """429 且带 Retry-After 时等待后重试一次"""
+    session = FakeWanSession(responses=[
+        FakeResponse(status_code=429, headers={"Retry-After": "0.01"}),
+        FakeResponse(data={"ok": True}),
+    ])
+
+    response = post_with_retry_after(
+        session, "https://api.example/x", deadline=time.monotonic() + 5, read_timeout=30, error_message="超时", data=b"{}"
+    )
+
+    assert response.status_code == 200
+    assert len(session.posts) == 2
+    assert all(post["data"] == b"{}" and post["timeout"][1] <= 5 for post in session.posts)
+
+
+def test_post_does_not_retry_without_budget():
+    """没有 Retry-After 或等待会越过截止时间时不重试，直接返回 429"""
+    for headers in ({}, {"Retry-After": "60"}):
+        session = FakeWanSession(responses=[
+            FakeResponse(status_code=429, headers=headers),
+            FakeResponse(data={"ok": True}),
+        ])
+
+        response = post_with_retry_after(
+            session, "https://api.example/x", deadline=time.monotonic() + 5, read_timeout=30, error_message="超时"
+        )
+
+        assert response.status_code == 429
+        assert len(session.posts) == 1
+
+
+def test_deadline_timeout_clips_to_remaining_time():
+    """超时不超过剩余时间，已过截止时间时抛出指定信息"""
+    connect, read = deadline_timeout(time.monotonic() + 2, 60, "超时")
+    assert connect <= 2 and read <= 2
+
+    with pytest.raises(Exception, match="已超时"):
+        deadline_timeout(time.monotonic() - 1, 60, "已超时")
@@ -0,0 +1,96 @@
+"""
+图片生成结果缓存测试
+"""
+import os
+
+from backend.utils.image_cache import ImageResultCache, create_image_cache
+
+
+def test_make_key_is_unambiguous():
+    """参数中含分隔符时，不同的参数组合得到不同的键"""
+    assert ImageResultCache.make_key("m", "a|b", "c") != ImageResultCache.make_key("m", "a", "b|c")
+    assert ImageResultCache.make_key("m", None) != ImageResultCache.make_key("m", "")
+    assert ImageResultCache.make_key("m", "a") == ImageResultCache.make_key("m", "a")
+
+
+def test_memory_cache_evicts_least_recently_used():
+    """内存缓存超出上限时淘汰最久未访问的条目"""
+    cache = ImageResultCache(max_items=2)
+    cache.set("a", b"A")
+    cache.set("b", b"B")
+    assert cache.get("a") == b"A"
+
+    cache.set("c", b"C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"A"
+    assert cache.get("c") == b"C"
+
+
+def test_disk_cache_survives_new_instance(tmp_path):
+    """磁盘缓存在新实例中仍可命中"""
+    key = ImageResultCache.make_key("m", "prompt")
+    ImageResultCache(cache_dir=str(tmp_path)).set(key, b"IMG")
+
+    assert ImageResultCache(cache_dir=str(tmp_path)).get(key) == b"IMG"
+
+
+def test_disk_eviction_only_touches_cache_files(tmp_path):
+    """磁盘淘汰按访问时间删除最旧的缓存文件，不删除目录中的其他文件"""
+    (tmp_path / "keep_me.png").write_bytes(b"user")
+    (tmp_path / "notes.txt").write_text("user")
+    cache = ImageResultCache(cache_dir=str(tmp_path), max_disk_items=2)
+    keys = [ImageResultCache.make_key("m", str(i)) for i in range(3)]
+    for index, key in enumerate(keys):
+        cache.set(key, b"IMG")
+        os.utime(tmp_path / key, (index, index))
+    cache.set(keys[2], b"IMG")
+
+    remaining = set(os.listdir(tmp_path))
+    assert remaining == {"keep_me.png", "notes.txt", keys[1], keys[2]}
+
+
+def test_create_image_cache_requires_enable_cache(tmp_path):
+    """未开启 enable_cache 时不创建缓存"""
+    assert create_image_cache({}) is None
+    assert create_image_cache({"enable_cache": False, "cache_dir": str(tmp_path)}) is None
+
+    cache = create_image_cache({"enable_cache": True, "cache_max_items": 3, "cache_max_disk_items": 5})
+    assert cache.max_items == 3
+    assert cache.max_disk_items == 5
+    assert cache.cache_dir is None
+
+
+def test_modelscope_cache_hit_skips_network(make_modelscope_generator):
+    """ModelScope 单张生成命中缓存时不再提交任务"""
+    generator = make_modelscope_generator(enable_cache=True)
+
+    assert generator.generate_image("a") == b"IMG-t1"
+    assert generator.generate_image("a") == b"IMG-t1"
+    assert generator._session.submitted == 1
+    assert generator._session.downloads == ["https://img.example/t1"]
+
+
+def test_modelscope_batch_uses_cache(make_modelscope_generator):
+    """ModelScope 批量生成只提交未命中缓存的提示词，并写入新结果"""
+    generator = make_modelscope_generator(enable_cache=True)
+    generator.generate_image("a")
+
+    assert generator.generate_images(["a", "b"], concurrency=1) == [b"IMG-t1", b"IMG-t2"]
+    assert generator._session.submitted == 2
+
+    assert generator.generate_images(["b", "a"]) == [b"IMG-t2", b"IMG-t1"]
+    assert generator._session.submitted == 2
+
+
+def test_wan_cache_hit_skips_network(make_wan_generator):
+    """通义万相命中缓存时不再发出请求"""
+    generator = make_wan_generator(enable_cache=True)
+
+    assert generator.generate_image("a") == b"WAN-IMG"
+    assert generator.generate_image("a") == b"WAN-IMG"
+    assert len(generator._session.posts) == 1
+    assert generator._session.downloads == ["https://img.example/wan"]
+
+    generator.generate_image("a", negative_prompt="blurry")
+    assert len(generator._session.posts) == 2
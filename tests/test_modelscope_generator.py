@@ -0,0 +1,201 @@
+"""
+ModelScope 生成器批量流水线与轮询调度测试
+"""
+import threading
+import time
+
+import pytest
+
+from backend.generators import modelscope_z_image
+from backend.utils import http_session
+from tests.conftest import FakeModelScopeSession
+
+
+def test_generate_images_keeps_prompt_order(make_modelscope_generator):
+    """批量结果与提示词顺序一致"""
+    generator = make_modelscope_generator()
+
+    results = generator.generate_images(["a", "b", "c"], concurrency=1)
+
+    # concurrency=1 时按提交顺序依次分配 t1、t2、t3
+    assert results == [b"IMG-t1", b"IMG-t2", b"IMG-t3"]
+
+
+def test_generate_images_isolates_failures(make_modelscope_generator):
+    """单个任务失败只影响对应位置，其他任务正常返回"""
+    generator = make_modelscope_generator()
+    generator._session.failing = {"t2"}
+
+    results = generator.generate_images(["a", "b", "c"], concurrency=1)
+
+    assert results[0] == b"IMG-t1"
+    assert isinstance(results[1], Exception)
+    assert "boom" in str(results[1])
+    assert results[2] == b"IMG-t3"
+    assert "https://img.example/t2" not in generator._session.downloads
+
+
+def test_generate_images_empty_prompts(make_modelscope_generator):
+    """空列表直接返回空结果，不发出请求"""
+    generator = make_modelscope_generator()
+
+    assert generator.generate_images([]) == []
+    assert generator._session.downloads == []
+
+
+def test_scheduler_fails_expired_job(make_modelscope_generator):
+    """超过截止时间的任务以超时异常结束，不再发出查询"""
+    generator = make_modelscope_generator()
+
+    future = modelscope_z_image._SCHEDULER.submit(generator, "t1", time.monotonic() - 1)
+
+    with pytest.raises(Exception, match="超时"):
+        future.result(timeout=2)
+    assert generator._session.polls == {}
+
+
+class _BlockingPollSession(FakeModelScopeSession):
+    """第一次查询阻塞到 release 被设置，便于在查询进行中发送回调"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def get(self, url, **kwargs):
+        if not self.entered.is_set():
+            self.entered.set()
+            self.release.wait(5)
+        return super().get(url, **kwargs)
+
+
+def test_wake_during_poll_triggers_one_repoll(make_modelscope_generator):
+    """查询进行中收到的回调只在查询结束后补查一次，不会重复排队"""
+    session = _BlockingPollSession(polls_needed=3)
+    generator = make_modelscope_generator(
+        session=session,
+        webhook_url="https://me.example/cb",
+        initial_poll_interval_seconds=30,
+        max_poll_interval_seconds=30,
+    )
+    task_id = "wake-1"
+    callback = {"task_id": task_id, "task_status": "SUCCEED"}
+    future = modelscope_z_image._SCHEDULER.submit(generator, task_id, time.monotonic() + 60)
+
+    assert modelscope_z_image.resolve_webhook(callback)
+    assert session.entered.wait(2)
+    modelscope_z_image.resolve_webhook(callback)
+    modelscope_z_image.resolve_webhook(callback)
+    session.release.set()
+
+    time.sleep(0.5)
+    assert session.polls[task_id] == 2
+    assert not future.done()
+
+    # 下一次唤醒完成任务，清理调度器中的条目
+    assert modelscope_z_image.resolve_webhook(callback)
+    assert future.result(timeout=2) == f"https://img.example/{task_id}"
+    assert session.polls[task_id] == 3
+
+
+def test_phased_calls_share_one_deadline(make_modelscope_generator):
+    """分阶段调用传入同一个截止时间，过期后后续阶段直接超时"""
+    generator = make_modelscope_generator()
+
+    deadline = generator.new_deadline()
+    task_id = generator.submit("a", deadline=deadline)
+    image_url = generator.await_ready(task_id, deadline=deadline)
+    assert generator.download(image_url, deadline=deadline) == b"IMG-t1"
+
+    with pytest.raises(Exception, match="超时"):
+        generator.download(image_url, deadline=time.monotonic() - 1)
+
+
+def test_hung_polls_do_not_stall_other_jobs(make_modelscope_generator, monkeypatch):
+    """查询线程被不响应的任务占满时，其他任务仍能完成，整体耗时受 max_wait_seconds 约束"""
+    monkeypatch.setattr(modelscope_z_image._PollScheduler, "_POLL_READ_TIMEOUT", 0.2)
+    workers = modelscope_z_image._PollScheduler._POLL_WORKERS
+    hanging = {f"t{i}" for i in range(1, workers + 1)}
+    generator = make_modelscope_generator(max_wait_seconds=1.5)
+    generator._session.hanging = hanging
+
+    started = time.monotonic()
+    results = generator.generate_images([str(i) for i in range(workers + 2)], concurrency=1)
+    elapsed = time.monotonic() - started
+
+    assert all(isinstance(result, Exception) for result in results[:workers])
+    assert results[workers:] == [f"IMG-t{workers + 1}".encode(), f"IMG-t{workers + 2}".encode()]
+    assert elapsed < 1.5 + 0.2 + 0.5
+
+
+class _FakeClock:
+    """替代生成器模块中的 time：monotonic 只随 sleep 与模拟的服务端等待前进"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """生成器与 HTTP 工具共用的模拟时钟"""
+    clock = _FakeClock()
+    monkeypatch.setattr(modelscope_z_image, "time", clock)
+    monkeypatch.setattr(http_session, "time", clock)
+    return clock
+
+
+class _LongPollSession(FakeModelScopeSession):
+    """记录每次查询的 wait 参数；honor_wait 为真时模拟服务端按 wait 等待"""
+
+    def __init__(self, clock, honor_wait, **kwargs):
+        super().__init__(**kwargs)
+        self.clock = clock
+        self.honor_wait = honor_wait
+        self.waits = []
+
+    def get(self, url, params=None, **kwargs):
+        if not url.startswith("https://img.example/"):
+            wait = (params or {}).get("wait")
+            self.waits.append(wait)
+            if wait and self.honor_wait:
+                self.clock.now += wait
+        return super().get(url, **kwargs)
+
+
+@pytest.mark.parametrize("configured, expected", [(1, 5), (2.5, 5), (0.5, 5), (7.9, 7), (0, 0)])
+def test_long_poll_seconds_is_clamped(make_modelscope_generator, configured, expected):
+    """过小或非整数的长轮询窗口被调整为可判定的整数秒"""
+    generator = make_modelscope_generator(long_poll_seconds=configured)
+
+    assert generator.long_poll_seconds == expected
+    assert generator._long_poll_enabled is (expected > 0)
+
+
+def test_long_poll_disabled_when_server_ignores_wait(make_modelscope_generator, fake_clock):
+    """服务端立即返回未完成状态时关闭长轮询，后续改用普通轮询"""
+    clock = fake_clock
+    session = _LongPollSession(clock, honor_wait=False, polls_needed=3)
+    generator = make_modelscope_generator(session=session, long_poll_seconds=1)
+
+    assert generator.generate_image("a") == b"IMG-t1"
+    assert session.waits == [5, None, None]
+    assert generator._long_poll_enabled is False
+
+
+def test_long_poll_confirmed_when_server_waits(make_modelscope_generator, fake_clock):
+    """服务端按 wait 等待时确认支持长轮询，且不再额外休眠"""
+    clock = fake_clock
+    session = _LongPollSession(clock, honor_wait=True, polls_needed=3)
+    generator = make_modelscope_generator(session=session, long_poll_seconds=5)
+
+    assert generator.generate_image("a") == b"IMG-t1"
+    assert session.waits == [5, 5, 5]
+    assert clock.now == 1015.0
+    assert generator._long_poll_enabled is True
+    assert generator._long_poll_confirmed is True
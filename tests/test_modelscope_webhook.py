@@ -0,0 +1,101 @@
+"""
+ModelScope 任务回调测试
+"""
+import threading
+import time
+
+import pytest
+
+from backend.generators import modelscope_z_image
+
+
+@pytest.fixture(autouse=True)
+def clear_webhook_registry():
+    """每个用例前后清空进程级的回调登记与提前到达记录"""
+    def _clear():
+        with modelscope_z_image._WEBHOOK_LOCK:
+            modelscope_z_image._WEBHOOK_WAITERS.clear()
+            modelscope_z_image._EARLY_WEBHOOKS.clear()
+
+    _clear()
+    yield
+    _clear()
+
+
+def test_callback_route_ignores_unknown_task(client):
+    """未登记任务的回调返回 accepted=False"""
+    response = client.post('/api/modelscope/callback', json={
+        "task_id": "unknown-task",
+        "task_status": "SUCCEED",
+        "output_images": ["http://evil.example/x.png"],
+    })
+    assert response.status_code == 200
+    assert response.get_json() == {"success": True, "accepted": False}
+
+
+def test_callback_route_rejects_non_object_body(client):
+    """非 JSON 对象的回调体被忽略"""
+    response = client.post('/api/modelscope/callback', json=["not", "a", "dict"])
+    assert response.status_code == 200
+    assert response.get_json()["accepted"] is False
+
+
+def test_spoofed_callback_does_not_override_task_result(make_modelscope_generator):
+    """伪造的回调只会触发一次状态查询，图片地址以任务查询结果为准"""
+    generator = make_modelscope_generator(webhook_url="https://me.example/cb", max_poll_interval_seconds=5)
+    session = generator._session
+    session.polls_needed = 3
+
+    # 在真实任务提交前伪造回调，并在等待过程中再次伪造
+    modelscope_z_image.resolve_webhook({
+        "task_id": "t1", "task_status": "SUCCEED", "output_images": ["http://evil.example/EVIL"],
+    })
+
+    def spoof():
+        for _ in range(5):
+            time.sleep(0.02)
+            modelscope_z_image.resolve_webhook({
+                "task_id": "t1", "task_status": "SUCCEED", "output_images": ["http://evil.example/EVIL"],
+            })
+
+    thread = threading.Thread(target=spoof)
+    thread.start()
+    image = generator.generate_image("prompt")
+    thread.join()
+
+    assert image == b"IMG-t1"
+    assert session.downloads == ["https://img.example/t1"]
+    assert "t1" not in modelscope_z_image._WEBHOOK_WAITERS
+
+
+def test_callback_wakes_waiting_task(make_modelscope_generator):
+    """收到回调后立即查询，而不是等满 max_poll_interval"""
+    generator = make_modelscope_generator(webhook_url="https://me.example/cb", max_poll_interval_seconds=30)
+    generator._session.polls_needed = 1
+
+    def callback():
+        time.sleep(0.1)
+        modelscope_z_image.resolve_webhook({"task_id": "t1", "task_status": "SUCCEED"})
+
+    thread = threading.Thread(target=callback)
+    thread.start()
+    started = time.monotonic()
+    assert generator.generate_image("prompt") == b"IMG-t1"
+    thread.join()
+    assert time.monotonic() - started < 5
+
+
+def test_early_callbacks_are_bounded():
+    """未登记任务的回调数量有上限"""
+    for index in range(modelscope_z_image._EARLY_WEBHOOK_MAX + 500):
+        modelscope_z_image.resolve_webhook({"task_id": f"junk-{index}", "task_status": "FAILED"})
+    assert len(modelscope_z_image._EARLY_WEBHOOKS) <= modelscope_z_image._EARLY_WEBHOOK_MAX
+    assert all(isinstance(value, float) for value in modelscope_z_image._EARLY_WEBHOOKS.values())
+
+
+def test_batch_generation_registers_and_releases_webhooks(make_modelscope_generator):
+    """批量生成时回调唤醒调度器中的任务，完成后注销"""
+    generator = make_modelscope_generator(webhook_url="https://me.example/cb")
+    results = generator.generate_images(["a", "b", "c"])
+    assert sorted(results) == [b"IMG-t1", b"IMG-t2", b"IMG-t3"]
+    assert not any(task_id in modelscope_z_image._WEBHOOK_WAITERS for task_id in ("t1", "t2", "t3"))
@@ -0,0 +1,82 @@
+"""
+通义万相 Wan2.6 生成器测试
+"""
+import pytest
+
+from backend.generators.wan26_t2i import _extract_image_url_or_b64
+from tests.conftest import FakeResponse, FakeWanSession
+
+
+def test_response_format_is_opt_in(make_wan_generator):
+    """默认不发送 response_format，开启 prefer_url_response 后才发送"""
+    generator = make_wan_generator()
+    generator.generate_image("a")
+    assert b"response_format" not in generator._session.posts[0]["data"]
+
+    generator = make_wan_generator(prefer_url_response=True)
+    generator.generate_image("a")
+    assert b'"response_format":"url"' in generator._session.posts[0]["data"]
+
+
+@pytest.mark.parametrize("data, expected", [
+    # output.results[0]
+    ({"output": {"results": [{"url": "https://a/1"}]}}, {"url": "https://a/1", "b64": None}),
+    ({"output": {"results": [{"b64_json": "QUJD"}]}}, {"url": None, "b64": "QUJD"}),
+    # results[0] 为空时不再查找 choices
+    ({"output": {"results": [None], "choices": [{"message": {"content": [{"image": "https://a/2"}]}}]}},
+     {"url": None, "b64": None}),
+    # choices[].message.content 为列表
+    ({"output": {"choices": [{"message": {"content": [{"text": "x"}, {"image": "https://a/3"}]}}]}},
+     {"url": "https://a/3", "b64": None}),
+    ({"output": {"choices": ["bad", {"message": {"content": [{"base64": "QUJD"}]}}]}},
+     {"url": None, "b64": "QUJD"}),
+    # choices[].message.content 为对象
+    ({"output": {"choices": [{"message": {"content": {"image_url": "https://a/4"}}}]}},
+     {"url": "https://a/4", "b64": None}),
+    # 没有结果
+    ({"output": {"choices": [{"message": {"content": [{"text": "x"}]}}]}}, {"url": None, "b64": None}),
+    ({"output": None}, {"url": None, "b64": None}),
+    ({}, {"url": None, "b64": None}),
+    ([], {"url": None, "b64": None}),
+])
+def test_extract_image_url_or_b64(data, expected):
+    """按 results、choices 列表、choices 对象的顺序提取图片地址或 base64"""
+    assert _extract_image_url_or_b64(data) == expected
+
+
+def test_extract_rejects_non_object_output():
+    """output 不是对象时报错"""
+    with pytest.raises(Exception, match="output"):
+        _extract_image_url_or_b64({"output": "oops"})
+
+
+def _b64_response(value):
+    return FakeResponse(data={"output": {"choices": [{"message": {"content": [{"b64_json": value}]}}]}})
+
+
+@pytest.mark.parametrize("value", [
+    "QUJD",
+    "data:image/png;base64,QUJD",
+])
+def test_base64_result_is_decoded(make_wan_generator, value):
+    """base64 结果（含 data URI）解码为图片数据，不再下载"""
+    generator = make_wan_generator(session=FakeWanSession(responses=[_b64_response(value)]))
+
+    assert generator.generate_image("a") == b"ABC"
+    assert generator._session.downloads == []
+
+
+def test_data_uri_without_comma_is_rejected(make_wan_generator):
+    """缺少逗号的 data URI 报错，而不是解码出错误的数据"""
+    generator = make_wan_generator(session=FakeWanSession(responses=[_b64_response("data:image/png;base64QUJD")]))
+
+    with pytest.raises(Exception, match="data URI"):
+        generator.generate_image("a")
+
+
+def test_missing_result_is_reported(make_wan_generator):
+    """响应中没有图片结果时报错"""
+    generator = make_wan_generator(session=FakeWanSession(responses=[FakeResponse(data={"output": {}})]))
+
+    with pytest.raises(Exception, match="未找到图片结果"):
+        generator.generate_image("a")